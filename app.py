@@ -1,8 +1,35 @@
 import streamlit as st
 import json
+import re
+import threading
+from operator import itemgetter
 import numpy as np
+import pandas as pd
 import onnxruntime as ort
 
+# Static page HTML
+_CSS_HTML = """
+<style>
+.big-title {font-size:35px;font-weight:700;color:#256D85;}
+.box { padding:12px; border-radius:10px; }
+.green {background:#c8f7c5; border-left:6px solid #2ecc71;}
+.yellow {background:#FFFACD; border-left:6px solid #F1C40F;}
+.red {background:#ffb3b3; border-left:6px solid #e74c3c;}
+.sidebar-anim {animation:pulse 2s infinite;}
+@keyframes pulse{
+    0%{background:#e8f6ff;}
+    50%{background:#c1eaff;}
+    100%{background:#e8f6ff;}
+}
+</style>
+"""
+_SIDEBAR_HTML = "<div class='sidebar-anim'><h3>📌 How to Use</h3></div>"
+_RISK_CLASSES = (("green", "NO RISK"), ("yellow", "LOW RISK"), ("red", "HIGH RISK"))
+_RISK_HTML = tuple(
+    f"<div class='box {risk_class}'><h3>{label} ({{prob:.2f}})</h3></div>"
+    for risk_class, label in _RISK_CLASSES
+)
+
 # -----------------------------------
 # Load ONNX Model & Feature Order
 # -----------------------------------
@@ -14,37 +41,83 @@ st.set_page_config(
 
 @st.cache_resource
 def load_model():
-    return ort.InferenceSession("asthma_rf.onnx")
+    # Single 1xN row per click: thread pools only add dispatch overhead
+    opts = ort.SessionOptions()
+    opts.intra_op_num_threads = 1
+    opts.inter_op_num_threads = 1
+    opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    # asthma_rf.ort already has every graph transform baked in
+    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+    # Pre-converted flatbuffer of asthma_rf.onnx; regenerate after retraining with
+    #   python -m onnxruntime.tools.convert_onnx_models_to_ort asthma_rf.onnx --optimization_style Fixed
+    return ort.InferenceSession(
+        "asthma_rf.ort",
+        sess_options=opts,
+        providers=["CPUExecutionProvider"],
+    )
 
 @st.cache_resource
 def load_features():
     with open("feature_order.json", "r") as f:
-        return json.load(f)
+        return tuple(json.load(f))
+
+@st.cache_resource
+def load_binding(_model, n_features):
+    # Reusable input buffer bound once; predict writes into it in place
+    x_buf = np.zeros((1, n_features), dtype=np.float32)
+    # OrtValue wraps x_buf's memory, so in-place writes need no copy
+    x_val = ort.OrtValue.ortvalue_from_numpy(x_buf)
+    binding = _model.io_binding()
+    binding.bind_ortvalue_input("input", x_val)
+    binding.bind_output("output_label")
+    # Warm-up run so the first click doesn't pay for lazy allocations
+    _model.run_with_iobinding(binding)
+    # Buffer is shared by every session thread
+    return x_buf, binding, threading.Lock()
+
+# Order of the values the form passes to predict()
+FORM_FEATURES = (
+    "Gender", "Age_Group", "Pregnancy_status", "Blood_pressure",
+    "Cholesterol", "Diabetes", "Home_pesticides", "Weed_pesticides",
+    "Had_asthma", "Still_asthma", "ER_visit_past_year",
+    "Smoking_frequency", "Cigarettes_per_day", "Duration_insulin",
+    "Weight_kg", "Height_cm", "BMI", "Exercise_per_month",
+)
+
+@st.cache_resource
+def load_slots(feature_order):
+    # SAFE ordering: form fields the model doesn't use are dropped,
+    # model inputs the form doesn't collect stay 0 in the buffer
+    cols = [i for i, feat in enumerate(FORM_FEATURES) if feat in feature_order]
+    slots = [feature_order.index(FORM_FEATURES[i]) for i in cols]
+    # Index array built once, so the per-click store doesn't convert a list;
+    # itemgetter picks the used form values in one C call
+    return itemgetter(*cols), np.array(slots, dtype=np.intp)
 
 model = load_model()
 feature_order = load_features()
+x_buf, binding, binding_lock = load_binding(model, len(feature_order))
+pick_form_values, form_slots = load_slots(feature_order)
+
+@st.cache_data(max_entries=1024, show_spinner=False)
+def predict(values):
+    # Keyed on the FORM_FEATURES tuple, so repeated inputs skip inference
+    with binding_lock:
+        x_buf[0, form_slots] = pick_form_values(values)
+        model.run_with_iobinding(binding)
+        return float(binding.get_outputs()[0].numpy()[0])
+
+def predict_batch(X):
+    # One run for all N rows; plain session.run needs no lock
+    return model.run(["output_label"], {"input": X})[0].astype(np.float32)
 
 # -----------------------------------
 # Styled UI
 # -----------------------------------
-st.markdown("""
-<style>
-.big-title {font-size:35px;font-weight:700;color:#256D85;}
-.box { padding:12px; border-radius:10px; }
-.green {background:#c8f7c5; border-left:6px solid #2ecc71;}
-.yellow {background:#FFFACD; border-left:6px solid #F1C40F;}
-.red {background:#ffb3b3; border-left:6px solid #e74c3c;}
-.sidebar-anim {animation:pulse 2s infinite;}
-@keyframes pulse{
-    0%{background:#e8f6ff;}
-    50%{background:#c1eaff;}
-    100%{background:#e8f6ff;}
-}
-</style>
-""", unsafe_allow_html=True)
+st.markdown(_CSS_HTML, unsafe_allow_html=True)
 
 with st.sidebar:
-    st.markdown("<div class='sidebar-anim'><h3>📌 How to Use</h3></div>", unsafe_allow_html=True)
+    st.markdown(_SIDEBAR_HTML, unsafe_allow_html=True)
     st.write("""
     👉 Enter your details  
     👉 Click Predict  
@@ -59,95 +132,101 @@ st.write("Created by **Noel Graceson — AI Meets Healthcare**")
 # Mapping Functions
 # -----------------------------------
 
-age_map = {"Under 15":0,"15-30":1,"30-45":2,"45-60":3,"60+":4}
-binary_map = {"Yes":1, "No":0}
-smoking_map = {"No":0, "Some days":1, "Every day":2, "Invalid":-1}
+# Selectboxes return the option index; *_VALUES[i] is its encoding
+GENDER_LABELS = ("Male", "Female")
+GENDER_VALUES = (1, 0)   # NEW mapping
+AGE_LABELS = ("Under 15", "15-30", "30-45", "45-60", "60+")
+AGE_VALUES = (0, 1, 2, 3, 4)
+BINARY_LABELS = ("Yes", "No")
+BINARY_VALUES = (1, 0)
+SMOKING_LABELS = ("No", "Some days", "Every day", "Invalid")
+SMOKING_VALUES = (0, 1, 2, -1)
 
 # UPDATED — added 2–5
-cigs_map = {"<1":0, "2-5":1, ">5":2, "Invalid":-1}
+CIGS_LABELS = ("<1", "2-5", ">5", "Invalid")
+CIGS_VALUES = (0, 1, 2, -1)
+
+def coded_select(label, labels):
+    return st.selectbox(label, range(len(labels)), format_func=labels.__getitem__)
+
+# Leading number of e.g. "6 months", as float() would parse the first word
+_DUR_RE = re.compile(r"\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)(?:\s|$)")
 
 def encode_duration(x):
     if x == "Invalid": return -1
+    m = _DUR_RE.match(x)
+    if not m: return -1
     try:
-        return int(float(str(x).split()[0]))
-    except:
+        return int(float(m.group(1)))
+    except (ValueError, OverflowError):
         return -1
 
 # -----------------------------------
 # UI Input Layout
 # -----------------------------------
-col1, col2 = st.columns(2)
-
-with col1:
-    gender_label = st.selectbox("Gender", ["Male", "Female"])  # NEW field
-    age_group = st.selectbox("Age Group", list(age_map.keys()))
-    pregnancy = st.selectbox("Pregnancy", ["Yes","No"])
-    blood_pressure = st.selectbox("High Blood Pressure", ["Yes","No"])
-    cholesterol = st.selectbox("High Cholesterol", ["Yes","No"])
-    diabetes = st.selectbox("Diabetes", ["Yes","No"])
-    home_pes = st.selectbox("Home Pesticides Exposure", ["Yes","No"])
-    weed_pes = st.selectbox("Weed Pesticides Exposure", ["Yes","No"])
-    had_asthma = st.selectbox("Ever Diagnosed with Asthma?", ["Yes","No"])
-
-with col2:
-    weight = st.number_input("Weight (kg)", 1.0, 200.0, 70.0)
-    height = st.number_input("Height (cm)", 50.0, 220.0, 170.0)
-    exercise = st.slider("Exercise Days per Month", 0, 30, 8)
-    smoking = st.selectbox("Smoking Frequency", list(smoking_map.keys()))
-    
-    # UPDATED — new dropdown option included
-    cigs = st.selectbox("Cigarettes per Day", list(cigs_map.keys()))
-    
-    duration_insulin = st.text_input("Insulin Duration (e.g., '6 months' or 'Invalid')", "Invalid")
-    still_asthma = st.selectbox("Currently Have Asthma?", ["Yes","No"])
-    er_visit = st.selectbox("ER Visit for Breathing Problems (Past year?)", ["Yes","No"])
+# Widgets inside a form only rerun the script on submit
+with st.form("predict_form"):
+    col1, col2 = st.columns(2)
+
+    with col1:
+        gender = coded_select("Gender", GENDER_LABELS)  # NEW field
+        age_group = coded_select("Age Group", AGE_LABELS)
+        pregnancy = coded_select("Pregnancy", BINARY_LABELS)
+        blood_pressure = coded_select("High Blood Pressure", BINARY_LABELS)
+        cholesterol = coded_select("High Cholesterol", BINARY_LABELS)
+        diabetes = coded_select("Diabetes", BINARY_LABELS)
+        home_pes = coded_select("Home Pesticides Exposure", BINARY_LABELS)
+        weed_pes = coded_select("Weed Pesticides Exposure", BINARY_LABELS)
+        had_asthma = coded_select("Ever Diagnosed with Asthma?", BINARY_LABELS)
+
+    with col2:
+        weight = st.number_input("Weight (kg)", 1.0, 200.0, 70.0)
+        height = st.number_input("Height (cm)", 50.0, 220.0, 170.0)
+        exercise = st.slider("Exercise Days per Month", 0, 30, 8)
+        smoking = coded_select("Smoking Frequency", SMOKING_LABELS)
+        
+        # UPDATED — new dropdown option included
+        cigs = coded_select("Cigarettes per Day", CIGS_LABELS)
+        
+        duration_insulin = st.text_input("Insulin Duration (e.g., '6 months' or 'Invalid')", "Invalid")
+        still_asthma = coded_select("Currently Have Asthma?", BINARY_LABELS)
+        er_visit = coded_select("ER Visit for Breathing Problems (Past year?)", BINARY_LABELS)
+
+    submitted = st.form_submit_button("🚀 Predict Asthma Risk")
 
 # BMI calculation
-bmi = weight / ((height/100)**2)
+bmi = 10000.0 * weight / (height * height)
 
 # -----------------------------------
 # Build Feature Vector
 # -----------------------------------
-if st.button("🚀 Predict Asthma Risk"):
+if submitted:
     
-    data_dict = {
-        "Gender": 1 if gender_label == "Male" else 0,   # NEW mapping
-        "Age_Group": age_map[age_group],
-        "Pregnancy_status": binary_map[pregnancy],
-        "Blood_pressure": binary_map[blood_pressure],
-        "Cholesterol": binary_map[cholesterol],
-        "Diabetes": binary_map[diabetes],
-        "Home_pesticides": binary_map[home_pes],
-        "Weed_pesticides": binary_map[weed_pes],
-        "Had_asthma": binary_map[had_asthma],
-        "Still_asthma": binary_map[still_asthma],
-        "ER_visit_past_year": binary_map[er_visit],
-        "Smoking_frequency": smoking_map[smoking],
-        "Cigarettes_per_day": cigs_map[cigs],
-        "Duration_insulin": encode_duration(duration_insulin),
-        "Weight_kg": weight,
-        "Height_cm": height,
-        "BMI": bmi,
-        "Exercise_per_month": exercise,
-    }
-
-    # SAFE ordering (prevents KeyError)
-    input_row = np.array([[data_dict.get(feat, 0) for feat in feature_order]], dtype=np.float32)
-
-    pred = model.run(None, {"input": input_row})[0][0]
-    prob = pred
-
-    if prob < 0.20:
-        risk_class = "green"
-        label = "NO RISK"
-    elif prob < 0.50:
-        risk_class = "yellow"
-        label = "LOW RISK"
-    else:
-        risk_class = "red"
-        label = "HIGH RISK"
+    # Same order as FORM_FEATURES
+    prob = predict((
+        GENDER_VALUES[gender],
+        AGE_VALUES[age_group],
+        BINARY_VALUES[pregnancy],
+        BINARY_VALUES[blood_pressure],
+        BINARY_VALUES[cholesterol],
+        BINARY_VALUES[diabetes],
+        BINARY_VALUES[home_pes],
+        BINARY_VALUES[weed_pes],
+        BINARY_VALUES[had_asthma],
+        BINARY_VALUES[still_asthma],
+        BINARY_VALUES[er_visit],
+        SMOKING_VALUES[smoking],
+        CIGS_VALUES[cigs],
+        encode_duration(duration_insulin),
+        weight,
+        height,
+        bmi,
+        exercise,
+    ))
 
-    st.markdown(f"<div class='box {risk_class}'><h3>{label} ({prob:.2f})</h3></div>", unsafe_allow_html=True)
+    # < 0.20 -> 0, < 0.50 -> 1, else 2
+    risk_idx = int(prob >= 0.20) + int(prob >= 0.50)
+    st.markdown(_RISK_HTML[risk_idx].format(prob=prob), unsafe_allow_html=True)
 
     st.subheader("📌 What This Means")
     st.write("""
@@ -162,3 +241,25 @@ if st.button("🚀 Predict Asthma Risk"):
 
     st.caption("Powered by ONNX AI • Built by Noel Graceson")
 
+
+# -----------------------------------
+# Batch Prediction (CSV)
+# -----------------------------------
+st.subheader("📂 Batch Prediction")
+upload = st.file_uploader("Upload a CSV with one patient per row, columns named as in feature_order.json", type="csv")
+
+if upload is not None:
+    df = pd.read_csv(upload)
+    # SAFE ordering: missing model columns are 0, extra columns ignored
+    try:
+        X = df.reindex(columns=list(feature_order), fill_value=0).to_numpy(np.float32)
+    except ValueError:
+        st.error("All model feature columns must be numeric (already encoded).")
+    else:
+        probs = predict_batch(X)
+        risk_idx = np.digitize(probs, [0.20, 0.50])
+        result = df.assign(
+            Risk_score=probs,
+            Risk_level=[_RISK_CLASSES[i][1] for i in risk_idx],
+        )
+        st.dataframe(result)